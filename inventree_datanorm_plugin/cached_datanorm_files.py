@@ -0,0 +1,183 @@
+"""DATANORM file wrappers, memoizing the results of their file searches.
+
+Each lookup in a DATANORM file scans the whole file, although the files attached to
+the virtual part rarely change. The search results are cached, keyed by the path and
+the modification time of the file, so a replaced file is searched again. The base
+files are read only once into an index of their articles by EAN.
+"""
+
+from functools import lru_cache
+import os
+import re
+
+from datanorm import (
+    DatanormBaseFile,
+    DatanormPriceFile,
+    DatanormProductGroupFile,
+)
+
+# EAN-8 and EAN-13 codes, as accepted by the barcode plugin
+_EAN_REGEX = re.compile(r"[0-9]{8}|[0-9]{13}")
+
+
+def _get_mtime(path: str) -> float | None:
+    """Modification time of the file, used to invalidate the cached search results
+
+    Args:
+        path (str): path to the file
+
+    Returns:
+        float | None: modification time or None if the file does not exist
+    """
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=16)
+def _index_base_file(
+    path: str, mtime: float | None, encoding: str
+) -> dict[str, tuple[int, int]]:
+    """Reads the base file once and indexes the offsets of the article lines by EAN
+
+    Args:
+        path (str): path to the DATANORM base file
+        mtime (float | None): modification time of the file
+        encoding (str): encoding of the file
+
+    Returns:
+        dict[str, tuple[int, int]]: offsets of the A and B line for each EAN
+    """
+    index = {}
+    if mtime is None:
+        return index
+
+    with open(path, "rb") as file_obj:
+        offset = len(file_obj.readline())
+        offset_a = None
+        for line in file_obj:
+            if line.startswith(b"A"):
+                offset_a = offset
+            elif line.startswith(b"B") and offset_a is not None:
+                fields = line.split(b";", 10)
+                if len(fields) > 9 and fields[9]:
+                    # keep the first article, like the linear file search does
+                    index.setdefault(fields[9].decode(encoding), (offset_a, offset))
+            offset += len(line)
+    return index
+
+
+def _search_base_file(path: str, encoding: str, ean: str) -> dict | None:
+    """Reads the lines of the article with the EAN at their indexed offsets
+
+    Args:
+        path (str): path to the DATANORM base file
+        encoding (str): encoding of the file
+        ean (str): EAN/GTIN to search for
+
+    Returns:
+        dict | None: V, A and B line of the article or None if not found
+    """
+    offsets = _index_base_file(path, _get_mtime(path), encoding).get(ean)
+    if offsets is None:
+        return None
+
+    with open(path, "rb") as file_obj:
+        lines = dict()
+        lines["V"] = file_obj.readline().decode(encoding).strip()
+        file_obj.seek(offsets[0])
+        lines["A"] = file_obj.readline().decode(encoding).strip()
+        file_obj.seek(offsets[1])
+        lines["B"] = file_obj.readline().decode(encoding).strip()
+    return lines
+
+
+@lru_cache(maxsize=1024)
+def _search_product_group_file(
+    path: str, mtime: float | None, encoding: str, main_group_id: str, group_id: str
+) -> dict | None:
+    """Searches the product group file, cached until the file is modified
+
+    Args:
+        path (str): path to the DATANORM product group file
+        mtime (float | None): modification time of the file
+        encoding (str): encoding of the file
+        main_group_id (str): ID of the main product group
+        group_id (str): ID of the product group
+
+    Returns:
+        dict | None: Lines of the product groups or None if not found
+    """
+    datanorm_file = DatanormProductGroupFile(path)
+    datanorm_file.encoding = encoding
+    return datanorm_file._search_file_for_group_ids(main_group_id, group_id)
+
+
+@lru_cache(maxsize=1024)
+def _search_price_file(
+    path: str, mtime: float | None, encoding: str, article_id: str
+) -> dict | None:
+    """Searches the price file, cached until the file is modified
+
+    Args:
+        path (str): path to the DATANORM price file
+        mtime (float | None): modification time of the file
+        encoding (str): encoding of the file
+        article_id (str): article number of the supplier
+
+    Returns:
+        dict | None: Price line of the article or None if not found
+    """
+    datanorm_file = DatanormPriceFile(path)
+    datanorm_file.encoding = encoding
+    return datanorm_file._search_file_for_article_id(article_id)
+
+
+class CachedDatanormBaseFile(DatanormBaseFile):
+    """DATANORM base file, looking up the articles in an index by EAN/GTIN. Searching
+    for article numbers is not supported.
+    """
+
+    def _search_file_for_id(self, id: str) -> dict | None:
+        """Lookup EAN/GTIN in the index of the DATANORM file
+
+        Args:
+            id (str): EAN/GTIN to look for
+
+        Raises:
+            ValueError: if the ID is no EAN/GTIN, e.g. an article number
+
+        Returns:
+            dict | None: Parsed lines, containing the product with the given EAN
+        """
+        if not _EAN_REGEX.fullmatch(id or ""):
+            raise ValueError(f"Only EAN/GTIN can be searched in the index, not {id!r}")
+        return _search_base_file(self.datanorm_file, self.encoding, id)
+
+
+class CachedDatanormProductGroupFile(DatanormProductGroupFile):
+    """DATANORM product group file, caching the search results per group IDs"""
+
+    def _search_file_for_group_ids(
+        self, main_group_id: str, group_id: str
+    ) -> dict | None:
+        return _search_product_group_file(
+            self.datanorm_file,
+            _get_mtime(self.datanorm_file),
+            self.encoding,
+            main_group_id,
+            group_id,
+        )
+
+
+class CachedDatanormPriceFile(DatanormPriceFile):
+    """DATANORM price file, caching the search results per article number"""
+
+    def _search_file_for_article_id(self, article_id: str) -> dict | None:
+        return _search_price_file(
+            self.datanorm_file,
+            _get_mtime(self.datanorm_file),
+            self.encoding,
+            article_id,
+        )
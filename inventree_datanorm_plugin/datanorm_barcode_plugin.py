@@ -1,10 +1,18 @@
+from collections import defaultdict
 import logging
-from typing import Iterator
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinLengthValidator
-
-from InvenTree.helpers import hash_barcode
+from django.core.files import File
+from django.db import transaction
+
+from InvenTree.helpers import hash_barcode, str2bool
+from .cached_datanorm_files import (
+    CachedDatanormBaseFile,
+    CachedDatanormPriceFile,
+    CachedDatanormProductGroupFile,
+)
 from .part_factory import PartFactory
+from .supplier_websites import fetch_part_img_urls
 from datanorm import (
     DatanormBaseFile,
     DatanormItem,
@@ -15,7 +23,6 @@ from datanorm import (
 from plugin import InvenTreePlugin
 from plugin.mixins import BarcodeMixin, SettingsMixin
 from part.models import Part, PartAttachment
-from company.models import SupplierPart
 
 logger = logging.getLogger("inventree")
 
@@ -36,7 +43,6 @@ def log(msg: str, type="info"):
         logger.warning(msg)
     elif type == "error":
         logger.error(msg)
-    print(f"{type}: {msg}")
 
 
 class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
@@ -96,13 +102,16 @@ class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
             log("Valid EAN code")
             # Search for EAN in keywords of all parts
             part = self.search_for_first_part_with_keyword(barcode_data)
-            reassign_barcode = self.get_setting("AUTOMATIC_BARCODE_ASSIGNMENT")
 
             # Create new part if none exists so far
             if part is None:
                 part = self.create_all_parts(barcode_data)
                 log(f"Part {part.pk} created")
-            elif reassign_barcode == "True" and part.barcode_hash == "":
+            elif part.barcode_hash == "" and str2bool(
+                self.get_setting("AUTOMATIC_BARCODE_ASSIGNMENT")
+            ):
+                # Only the barcode hash was loaded, fetch the whole part to save it
+                part = Part.objects.get(pk=part.pk)
                 hashed_ean = hash_barcode(barcode_data)
                 part.assign_barcode(hashed_ean, barcode_data)
                 log(f"Barcode reassigned to {part.pk}")
@@ -117,9 +126,13 @@ class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
             keyword (_type_): keyword to search for
 
         Returns:
-            Part | None: First part found
+            Part | None: First part found, only its barcode hash is loaded
         """
-        return Part.objects.filter(keywords__contains=keyword).first()
+        return (
+            Part.objects.filter(keywords__contains=keyword)
+            .only("barcode_hash")
+            .first()
+        )
 
     @staticmethod
     def search_for_part_with_name(name) -> Part | None:
@@ -146,23 +159,16 @@ class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
         Returns:
             bool: Result of evaluation
         """
-        # code has to be numeric
-        if not code.isnumeric():
+        # code has to consist of digits only
+        if not (code.isascii() and code.isdigit()):
             return False
 
         if len(code) == 13 or len(code) == 8:
-            # everything has to be flipped to work with EAN-8 and EAN-13
-            factor = "131313131313"[::-1]
-            checksum = int(code[-1])
-            flipped_prefix = code[:-1][::-1]
-            sum_if_digits = 0
-
-            # Iterate over the string
-            for i, digit in enumerate(flipped_prefix):
-                sum_if_digits += int(digit) * int(factor[i])
-            last_digit = sum_if_digits % 10
-            computed_checksum = (10 - last_digit) % 10
-            return checksum == computed_checksum
+            # weights are counted from the right to work with EAN-8 and EAN-13
+            digits = [char - 48 for char in code.encode()]  # 48 == ord("0")
+            sum_of_digits = 3 * sum(digits[-2::-2]) + sum(digits[-3::-2])
+            computed_checksum = (10 - sum_of_digits % 10) % 10
+            return digits[-1] == computed_checksum
         else:
             return False
 
@@ -179,15 +185,17 @@ class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
         datanorm_items = self.search_ean_in_datanorm_files(ean)
 
         overwrite_category = self.get_setting("DEFAULT_CATEGORY")
-        use_overwrite_category = self.get_setting("USE_DEFAULT_CATEGORY")
-        if use_overwrite_category == "True":
+        use_overwrite_category = str2bool(self.get_setting("USE_DEFAULT_CATEGORY"))
+        if use_overwrite_category:
             self.overwrite_category(datanorm_items, overwrite_category)
 
         # If EAN was found in a datanornm file, continue
         if len(datanorm_items) > 0:
+            # opens its own transaction after requesting the supplier websites
             part = self.create_all_parts_from_datanorm_items(datanorm_items)
         else:
-            part = PartFactory.create_empty_part_from_ean(ean, overwrite_category)
+            with transaction.atomic():
+                part = PartFactory.create_empty_part_from_ean(ean, overwrite_category)
         return part
 
     def search_ean_in_datanorm_files(self, ean: str) -> list[DatanormItem | None]:
@@ -202,16 +210,19 @@ class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
         datanorm_items = []
         attachments = self.get_datanorm_files()
         if attachments is not None:
+            supplier_files = self.get_supplier_files(attachments)
             for file in attachments:
                 if file_name_is_valid(DatanormBaseFile, file.basename):
 
-                    datanorm_files = self.get_other_supplier_files(file.comment)
+                    datanorm_files = supplier_files[file.comment]
                     datanorm_item = DatanormItem(tag=file.comment)
-                    DatanormBaseFile(file.attachment.path).parse(datanorm_item, ean)
-                    grp_file = DatanormProductGroupFile(datanorm_files["WRG"])
+                    base_file = CachedDatanormBaseFile(file.attachment.path)
+                    base_file.parse(datanorm_item, ean)
+                    grp_file = CachedDatanormProductGroupFile(datanorm_files["WRG"])
                     grp_file.encoding = "iso-8859-1"
                     grp_file.parse(datanorm_item)
-                    DatanormPriceFile(datanorm_files["DATPREIS"]).parse(datanorm_item)
+                    price_file = CachedDatanormPriceFile(datanorm_files["DATPREIS"])
+                    price_file.parse(datanorm_item)
                     fileinfo = f"{file.basename} ({file.comment})"
                     if datanorm_item.is_valid:
                         datanorm_items.append(datanorm_item)
@@ -220,45 +231,44 @@ class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
                         log(f"Not found in {fileinfo}")
         return datanorm_items
 
-    def get_datanorm_files(self) -> Iterator[PartAttachment] | None:
-        """Iterator for all attachments of the virtual part, defined in the plugin
+    def get_datanorm_files(self) -> list[PartAttachment] | None:
+        """List of all attachments of the virtual part, defined in the plugin
         settings.
 
-        Yields:
-            Iterator[PartAttachment]: Iterator over all files, attached to this \
-                                      plugins part
+        Returns:
+            list[PartAttachment] | None: All files, attached to this plugins part
         """
         attachments = None
         pk = self.get_setting("DATANORM_PART")
         if pk:
             virtual_datanorm_part = Part.objects.get(pk=pk)
-            attachments = virtual_datanorm_part.part_attachments.iterator()
+            # basename is derived from the attachment file
+            attachments = list(
+                virtual_datanorm_part.part_attachments.only("attachment", "comment")
+            )
         else:
             log("No DATANORM files are provided!", "error")
         return attachments
 
-    def get_other_supplier_files(self, datanorm_supplier: str) -> dict:
-        """Searches for the connected DATANORM files for a given supplier, based on the
-        attachment comments
+    @staticmethod
+    def get_supplier_files(attachments: list[PartAttachment]) -> dict[str, dict]:
+        """Groups the connected DATANORM files by supplier, based on the attachment
+        comments
 
         Args:
-            datanorm_supplier (str): Comment of the DATANORM attachment file
+            attachments (list[PartAttachment]): All DATANORM attachment files
 
         Returns:
-            dict: Product group and pricing file attachment
+            dict[str, dict]: Product group and pricing file attachment per comment
         """
-        files = {"WRG": "", "DATPREIS": ""}
-        for file in self.get_datanorm_files():
-            if file.comment == datanorm_supplier and file_name_is_valid(
-                DatanormProductGroupFile, file.basename
-            ):
-                files["WRG"] = file.attachment.path
-            elif file.comment == datanorm_supplier and file_name_is_valid(
-                DatanormPriceFile, file.basename
-            ):
-                files["DATPREIS"] = file.attachment.path
+        supplier_files = defaultdict(lambda: {"WRG": "", "DATPREIS": ""})
+        for file in attachments:
+            if file_name_is_valid(DatanormProductGroupFile, file.basename):
+                supplier_files[file.comment]["WRG"] = file.attachment.path
+            elif file_name_is_valid(DatanormPriceFile, file.basename):
+                supplier_files[file.comment]["DATPREIS"] = file.attachment.path
 
-        return files
+        return supplier_files
 
     def create_all_parts_from_datanorm_items(
         self, datanorm_items: list[DatanormItem]
@@ -271,34 +281,72 @@ class DatanormBarcodePlugin(BarcodeMixin, SettingsMixin, InvenTreePlugin):
         Returns:
             Part: base part, all other parts refer to.
         """
+        part_factories = [PartFactory(di) for di in datanorm_items]
+
         # check if part with same name already exists
         part = self.search_for_part_with_name(datanorm_items[0].item_name)
-        if part is None:
-            # create actual part from first datanorm item
-            pf = PartFactory(datanorm_items[0])
-            part = pf.create_part_from_datanorm_item()
-        else:
-            part.keywords += f",{datanorm_items[0].ean}"
-            part.save()
-
-        m_part = None
-        s_parts: list[SupplierPart] = []
-        for datanorm_item in datanorm_items:
-            pf_i = PartFactory(datanorm_item)
-            # create only one manufacturer part!
-            if m_part is None:
-                # if part has a manufacturer, create manufacturer part
-                m_part = pf_i.create_manufacturer_part_from_datanorm_item(part)
-
-            # create supplier part
-            s_parts.append(pf_i.create_supplier_part_from_datanorm_item(part))
-
-        if m_part is not None:
-            for s_part in s_parts:
-                s_part.manufacturer_part = m_part
-                s_part.save()
+
+        # The supplier websites are requested before the transaction is opened, so
+        # no transaction waits for them
+        image = None
+        if part is None or not part.image:
+            image = self.fetch_part_image(part_factories)
+
+        try:
+            # Commit all created parts at once
+            with transaction.atomic():
+                if part is None:
+                    # create actual part from first datanorm item
+                    part = part_factories[0].create_part_from_datanorm_item()
+                else:
+                    # add the EAN once to the keywords of the existing part
+                    keywords = list(
+                        dict.fromkeys(filter(None, (part.keywords or "").split(",")))
+                    )
+                    if datanorm_items[0].ean not in keywords:
+                        keywords.append(datanorm_items[0].ean)
+                        part.keywords = ",".join(keywords)
+                        part.save(update_fields=["keywords"])
+
+                if image is not None:
+                    part.image.save(image.name, image, save=True)
+
+                m_part = None
+                for pf_i in part_factories:
+                    # create only one manufacturer part, if part has a manufacturer!
+                    m_part = pf_i.create_manufacturer_part_from_datanorm_item(part)
+                    if m_part is not None:
+                        break
+
+                for pf_i in part_factories:
+                    # create supplier part, already linked to the manufacturer part
+                    pf_i.create_supplier_part_from_datanorm_item(part, m_part)
+        finally:
+            if image is not None:
+                image.close()
         return part
 
+    @staticmethod
+    def fetch_part_image(part_factories: list[PartFactory]) -> File | None:
+        """Fetches the part image from the first supplier website providing one.
+
+        Args:
+            part_factories (list[PartFactory]): Factories of all supplier parts
+
+        Returns:
+            File | None: Image file, to be closed by the caller, or None
+        """
+        # acquire the image URLs of all suppliers at once
+        img_urls = fetch_part_img_urls(
+            [pf_i.supplier_website for pf_i in part_factories]
+        )
+        # Try to fetch the image from different suppliers until success
+        for img_url in img_urls:
+            image = PartFactory.fetch_image(img_url)
+            if image is not None:
+                return image
+        return None
+
     @staticmethod
     def format_matched_response(part: Part) -> dict:
         """Format a response for the scanned data.
@@ -1,10 +1,16 @@
+from functools import cache, cached_property
+import logging
 from moneyed import Money
 import requests
+from tempfile import SpooledTemporaryFile
 from urllib.parse import urlparse
 
-from django.core.files.base import ContentFile
+from django.core.files import File
+from django.db.models import Case, Q, When
 from datanorm import DatanormItem
 from .supplier_websites import (
+    REQUEST_TIMEOUT,
+    SESSION,
     SupplierWebsite,
     get_supplier_website,
 )
@@ -12,6 +18,11 @@ from part.models import Part, PartCategory
 from company.models import Company, ManufacturerPart, SupplierPart
 from InvenTree.helpers import hash_barcode
 
+logger = logging.getLogger("inventree")
+
+# Images larger than this (in bytes) are not attached to parts
+MAX_IMAGE_SIZE = 20 * 1024 * 1024
+
 
 class PartFactory:
     di: DatanormItem
@@ -29,7 +40,17 @@ class PartFactory:
         self.di = di
         self.default_category = default_category
 
+    @cached_property
+    def supplier_website(self) -> SupplierWebsite | None:
+        """Website wrapper of the supplier of the DATANORM item.
+
+        Returns:
+            SupplierWebsite | None: Object wrapper of the suppliers website
+        """
+        return get_supplier_website(self.di.tag, self.di.article_id)
+
     @staticmethod
+    @cache
     def format_si_units(unit: str) -> str:
         target_unit = ""
         upper_unit = unit.upper()
@@ -83,20 +104,17 @@ class PartFactory:
             PartCategory: Existing or newly created category
         """
         if parent_name == "":
-            parent = None
             category = PartCategory.objects.filter(name=category_name).first()
+            if category is None:
+                category = PartCategory.objects.create(name=category_name)
         else:
             parent = PartCategory.objects.filter(name=parent_name).first()
             if parent is None:
-                parent = PartCategory(name=parent_name)
-                parent.save()
-            category = PartCategory.objects.filter(
-                name=category_name, parent_id=parent.pk
-            ).first()
-
-        if category is None:
-            category = PartCategory(name=category_name, parent=parent)
-            category.save()
+                parent = PartCategory.objects.create(name=parent_name)
+            # name and parent identify a category, since sibling names are unique
+            category, _created = PartCategory.objects.get_or_create(
+                name=category_name, parent=parent
+            )
         return category
 
     @staticmethod
@@ -115,9 +133,14 @@ class PartFactory:
             Company: Existing or newly created company, marked as supplier \
                      and/or manufacturer
         """
-        company = Company.objects.filter(name__contains=company_name).first()
-        if company is None:
-            company = Company.objects.filter(name__iexact=company_name).first()
+        # prefer the case-insensitive exact match over other matches
+        company = (
+            Company.objects.filter(
+                Q(name__contains=company_name) | Q(name__iexact=company_name)
+            )
+            .order_by(Case(When(name__iexact=company_name, then=0), default=1), "pk")
+            .first()
+        )
 
         if company is None:
             company = Company(
@@ -125,10 +148,13 @@ class PartFactory:
                 is_supplier=set_supplier,
                 is_manufacturer=set_manufacturer,
             )
-        else:
+            company.save()
+        elif (set_supplier and not company.is_supplier) or (
+            set_manufacturer and not company.is_manufacturer
+        ):
             company.is_supplier |= set_supplier
             company.is_manufacturer |= set_manufacturer
-        company.save()
+            company.save()
         return company
 
     def create_part_from_datanorm_item(self) -> Part:
@@ -181,18 +207,22 @@ class PartFactory:
             manufacturer = PartFactory.get_company_by_name(
                 manufacturer_name, set_manufacturer=True
             )
-            manufacturer.save()
             manufacturer_part = ManufacturerPart(
                 part=part, manufacturer=manufacturer, MPN=self.di.alt_article_id
             )
             manufacturer_part.save()
         return manufacturer_part
 
-    def create_supplier_part_from_datanorm_item(self, part: Part) -> SupplierPart:
-        """Creates a new supplier part from the DATANORM item
+    def create_supplier_part_from_datanorm_item(
+        self, part: Part, manufacturer_part: ManufacturerPart | None = None
+    ) -> SupplierPart:
+        """Creates a new supplier part from the DATANORM item. The part image is not
+        fetched here, see fetch_image().
 
         Args:
             part (Part): Part, previously created from the DATANORM item
+            manufacturer_part (ManufacturerPart | None, optional): Manufacturer part
+            to link the supplier part to. Defaults to None.
 
         Returns:
             SupplierPart: Newly created supplier part
@@ -203,15 +233,13 @@ class PartFactory:
         sku = self.di.article_id
         link = ""
         supplier = PartFactory.get_company_by_name(supplier_name, set_supplier=True)
-        supplier_website = get_supplier_website(supplier_name, sku)
+        supplier_website = self.supplier_website
         if supplier_website is not None:
             link = supplier_website.get_part_url()
-            # Try to fetch the image from different suppliers until success
-            if not part.image:
-                self.fetch_and_save_image_to_part(part, supplier_website)
         supplier_part = SupplierPart(
             part=part,
             supplier=supplier,
+            manufacturer_part=manufacturer_part,
             SKU=sku,
             link=link,
             pack_quantity=self.di.minimum_packaging_quantity,
@@ -219,22 +247,56 @@ class PartFactory:
         )
         price = Money(self.di.price_wholesale, self.di.currency)
         supplier_part.save()
+        # The price break is a separate object, the supplier part is not modified
         supplier_part.add_price_break(self.di.price_unit, price)
-        supplier_part.save()
         return supplier_part
 
-    def fetch_and_save_image_to_part(
-        self, part: Part, supplier_part_website: SupplierWebsite
-    ):
-        """Fetches the image from the suppliers website and attaches it to the part
+    @staticmethod
+    def parse_content_length(response: requests.Response) -> int:
+        """Announced size of the response body
 
         Args:
-            part (Part): Part, the image is attached to
-            supplier_part_website (SupplierWebsite): Website wrapper of the supplier
+            response (requests.Response): Response to check
+
+        Returns:
+            int: Size in bytes, 0 if unknown or malformed
+        """
+        try:
+            return int(response.headers.get("Content-Length") or 0)
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def fetch_image(img_url: str) -> File | None:
+        """Fetches an image from the suppliers website into a temporary file, which
+        has to be closed by the caller.
+
+        Args:
+            img_url (str): URL of the image on the suppliers website
+
+        Returns:
+            File | None: Image file, named like the URL, or None if not available
         """
-        img_url = supplier_part_website.get_part_img_url()
-        if img_url:
-            name = urlparse(img_url).path.split("/")[-1]
-            response = requests.get(img_url)
-            if response.status_code == 200:
-                part.image.save(name, ContentFile(response.content), save=True)
+        if not img_url:
+            return None
+        name = urlparse(img_url).path.split("/")[-1]
+        # Stream the image into a temporary file, spilled to disk if large
+        image_file = SpooledTemporaryFile(max_size=1024 * 1024)
+        try:
+            with SESSION.get(img_url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                content_length = PartFactory.parse_content_length(response)
+                if response.status_code != 200 or content_length > MAX_IMAGE_SIZE:
+                    image_file.close()
+                    return None
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    image_file.write(chunk)
+                    if image_file.tell() > MAX_IMAGE_SIZE:
+                        image_file.close()
+                        return None
+        except requests.RequestException as e:
+            # The image is optional, the part is created without it
+            logger.warning(f"Could not fetch image {img_url}: {e}")
+            image_file.close()
+            return None
+        image_file.seek(0)
+        return File(image_file, name=name)
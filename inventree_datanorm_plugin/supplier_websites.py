@@ -1,7 +1,39 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import logging
+import orjson
 import re
+import threading
 import time
+import unicodedata
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote
+
+_WUERTH_IMG_REGEX = re.compile(
+    r"<img class=\"img-fluid js-socialshare-media\".*?(src|data-lazy)=\"(?P<URL>\S+?)\""  # noqa: E501
+)
+
+logger = logging.getLogger("inventree")
+
+# GraphQL query for the image of a product on the Bürkle website
+_BUERKLE_QUERY = (
+    "query ProductPage($sku: String!) "
+    "{ getProductBySku(sku: $sku) { image { url } } }"
+)
+
+# Shared HTTP session, keeping the connections to the supplier websites alive
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+
+# Seconds to wait for a supplier website to connect or to send data
+REQUEST_TIMEOUT = 10
+
+
+def _timestamp_ms() -> int:
+    """Current time in milliseconds, used as cache buster in the API requests"""
+    return time.time_ns() // 1_000_000
 
 
 class SupplierWebsite(ABC):
@@ -9,9 +41,13 @@ class SupplierWebsite(ABC):
     parameters: dict | None = None
 
     def __init__(self, sku: str | None = None):
+        """Wrapper of a suppliers website. The part parameters are fetched on demand,
+        when they are needed for the first time.
+
+        Args:
+            sku (str | None, optional): SKU of the part. Defaults to None.
+        """
         self.sku = sku
-        if sku is not None:
-            self.fetch_part_parameters(sku)
 
     @abstractmethod
     def fetch_part_parameters(self, sku: str):
@@ -45,21 +81,56 @@ class SupplierWebsite(ABC):
 
 
 class BuerkleWebsite(SupplierWebsite):
+    # Maximum number of parts fetched with one request
+    BATCH_SIZE = 50
+
+    @classmethod
+    def fetch_batch(cls, skus: list[str]) -> dict[str, dict]:
+        """Fetches the parameters of several parts at once, requesting each part by
+        an alias of the same GraphQL query.
+
+        Args:
+            skus (list[str]): SKUs of the parts
+
+        Returns:
+            dict[str, dict]: Parameters of each found part by SKU
+        """
+        parameters = dict()
+        for start in range(0, len(skus), cls.BATCH_SIZE):
+            batch = skus[start : start + cls.BATCH_SIZE]
+            declarations = ", ".join(f"$s{i}: String!" for i in range(len(batch)))
+            fields = " ".join(
+                f"s{i}: getProductBySku(sku: $s{i}) {{ image {{ url }} }}"
+                for i in range(len(batch))
+            )
+            query = {
+                "variables": {f"s{i}": sku for i, sku in enumerate(batch)},
+                "query": f"query Products({declarations}) {{ {fields} }}",
+            }
+            response = SESSION.post(
+                "https://api-prod.alexander-buerkle.com/graphql",
+                json=query,
+                timeout=REQUEST_TIMEOUT,
+            )
+            if response.status_code == 200:
+                data = orjson.loads(response.content).get("data") or dict()
+                for i, sku in enumerate(batch):
+                    if data.get(f"s{i}") is not None:
+                        parameters[sku] = data[f"s{i}"]
+        return parameters
 
     def fetch_part_parameters(self, sku: str):
         self.sku = sku
         parameters = None
-        client = requests.Session()
         # The following request is neccessary to acquire a valid session ID!
-        query = {
-            "variables": {"sku": sku},
-            "query": "query ProductPage($sku: String!, $tracking: Tracking) {  getProductBySku(sku: $sku, tracking: $tracking) {    ...productPageFields    alternativesEnventa {      ...productPageFields      __typename    }    similarProducts {      ...productPageFields      __typename    }    baseProducts {      ...productPageFields      __typename    }    necessaryAccessories {      ...productPageFields      __typename    }    necessarySelections {      ...productPageFields      __typename    }    parts {      ...productPageFields      __typename    }    accessoriesProducts {      ...productPageFields      __typename    }    spareParts {      ...productPageFields      __typename    }    replacments {      ...productPageFields      __typename    }    __typename  }}fragment productPageFields on Product {  id  slug  description  categories  categoryKey  version  relationType  sku  productName  ean  supplierId  supplierProductType  supplierProductLink  supplierProductNumber  supplierUnit  oxomiProductNumber  image {    url    label    __typename  }  procuredProduct  productCocontractor  salesUnit  weight  packagingSize  customTariffNumber  salesNumber  maxAvailableQuantity  quantityUnit  topProduct  reachInfo  isTecselect  isAbakus  isAbakusPlus  isPromotion  isUnqualifiedContractProduct  onlineAvailable  customerArticleNumber  pickupStoreFreiburg {    channel {      name      primaryChannel      id      key      address {        id        externalId        primaryAddress        name        streetName        city        postalCode        country        addressExtraLineOne        addressExtraLineTwo        addressExtraLineThree        __typename      }      __typename    }    availability {      availableQuantity      __typename    }    __typename  }  productDocumentsDeha {    name    link    __typename  }  productFeatures {    unit    featureValueScoped {      minValue      maxValue      __typename    }    featureValues    featureName    __typename  }  __typename}",  # noqa: E501
-        }
-        response = client.post(
-            "https://api-prod.alexander-buerkle.com/graphql", json=query
+        query = {"variables": {"sku": sku}, "query": _BUERKLE_QUERY}
+        response = SESSION.post(
+            "https://api-prod.alexander-buerkle.com/graphql",
+            json=query,
+            timeout=REQUEST_TIMEOUT,
         )
         if response.status_code == 200:
-            parameters = response.json()["data"]["getProductBySku"]
+            parameters = orjson.loads(response.content)["data"]["getProductBySku"]
         self.parameters = parameters
 
     def get_part_img_url(self) -> str:
@@ -67,7 +138,10 @@ class BuerkleWebsite(SupplierWebsite):
         if self.parameters is None:
             self.fetch_part_parameters(self.sku)
 
-        img_url = self.parameters["image"][0]["url"]
+        # parts unknown to the website or without images have no image URL
+        images = (self.parameters or dict()).get("image") or []
+        if len(images) > 0:
+            img_url = images[0]["url"]
         return img_url
 
     def get_part_url(self, sku: str | None = None) -> str:
@@ -97,43 +171,100 @@ class WuerthWebsite(SupplierWebsite):
 
     def get_part_img_url(self) -> str:
         img_url = ""
-        response = requests.get(self.get_part_url(self.sku))
-        if response.status_code == 200:
-            match_object = re.search(
-                r"<img class=\"img-fluid js-socialshare-media\".*?(src|data-lazy)=\"(?P<URL>\S+?)\"",  # noqa: E501
-                response.text,
-            )
-            if match_object is not None:
-                img_url = match_object.group("URL")
+        with SESSION.get(
+            self.get_part_url(self.sku), stream=True, timeout=REQUEST_TIMEOUT
+        ) as response:
+            if response.status_code == 200:
+                # Search the page while downloading it and stop at the first match.
+                # The tail of the previous chunks is kept to find tags across chunks.
+                response.encoding = response.encoding or "utf-8"
+                page = ""
+                for chunk in response.iter_content(
+                    chunk_size=16 * 1024, decode_unicode=True
+                ):
+                    page = page[-4096:] + chunk
+                    match_object = _WUERTH_IMG_REGEX.search(page)
+                    if match_object is not None:
+                        img_url = match_object.group("URL")
+                        break
         return img_url
 
     def get_part_url(self, sku: str | None = None) -> str:
         if sku is None:
             sku = self.sku
-        sku_escaped = sku[:-5].strip().replace(" ", "%20")  # trim package quantity
+        sku_escaped = quote(sku[:-5].strip(), safe="")  # trim package quantity
         return f"https://www.wuerth.de/web/media/system/search_redirector.php?SearchResultType=all&EffectiveSearchTerm=&ApiLocale=de_DE&VisibleSearchTerm={sku_escaped}"  # noqa: E501
 
 
 class ZanderWebsite(SupplierWebsite):
+    # Seconds after which a new session ID is acquired
+    LOGIN_TIMEOUT = 600
+
+    _login_time: float | None = None
+    _login_lock = threading.Lock()
+
+    @classmethod
+    def login(cls, expired_login_time: float | None = None) -> float:
+        """Acquires a session ID for the shared session, unless the last one is
+        still valid. While one thread logs in, the others wait for the session ID
+        at most for the request timeout.
+
+        Args:
+            expired_login_time (float | None, optional): Login time of a session ID,
+            the website did not accept. Defaults to None.
+
+        Returns:
+            float: Login time of the valid session ID
+        """
+        with cls._login_lock:
+            now = time.monotonic()
+            if (
+                cls._login_time is None
+                or cls._login_time == expired_login_time
+                or now - cls._login_time > cls.LOGIN_TIMEOUT
+            ):
+                cls._login_time = None
+                SESSION.get(
+                    f"https://zander.online/api/v1.0/shop/user/open/login?device=&launch=&version=3.119.0&t={_timestamp_ms()}",  # noqa: E501
+                    timeout=REQUEST_TIMEOUT,
+                )
+                cls._login_time = now
+            return cls._login_time
 
     def fetch_part_parameters(self, sku: str):
         self.sku = sku
         parameters = None
-        client = requests.Session()
-        # The following request is neccessary to acquire a valid session ID!
-        client.get(
-            f"https://zander.online/api/v1.0/shop/user/open/login?device=&launch=&version=3.119.0&t={int(round(time.time() * 1000))}"  # noqa: E501
-        )
-        details_url = f"https://zander.online/api/v1.0/shop/article/{sku}/details?menge=1&misc=&t={int(round(time.time() * 1000))}"  # noqa: E501
-        response = client.get(details_url)
+        # A valid session ID is neccessary to fetch the details!
+        login_time = ZanderWebsite.login()
+        response = self.fetch_part_details(sku)
+        if response.status_code in (401, 403):
+            # The session ID is expired, acquire a new one and retry once
+            ZanderWebsite.login(expired_login_time=login_time)
+            response = self.fetch_part_details(sku)
         if response.status_code == 200:
-            parameters = response.json()["result"]["artikel"]
+            parameters = orjson.loads(response.content)["result"]["artikel"]
         self.parameters = parameters
 
+    @staticmethod
+    def fetch_part_details(sku: str) -> requests.Response:
+        """Requests the article details with the current session ID
+
+        Args:
+            sku (str): SKU of the part
+
+        Returns:
+            requests.Response: Response of the details request
+        """
+        details_url = f"https://zander.online/api/v1.0/shop/article/{sku}/details?menge=1&misc=&t={_timestamp_ms()}"  # noqa: E501
+        return SESSION.get(details_url, timeout=REQUEST_TIMEOUT)
+
     def get_part_img_url(self) -> str:
         img_url = ""
         if self.parameters is None:
             self.fetch_part_parameters(self.sku)
+        if self.parameters is None:
+            # part is unknown to the website
+            return img_url
 
         img_size = 600
         formatted_artikel_prefix = "-".join(
@@ -151,8 +282,23 @@ class ZanderWebsite(SupplierWebsite):
         return f"https://zander.online/artikel/{sku}"
 
 
+# Known suppliers in the upper case supplier name, the group names are mapped to the
+# website wrappers. Umlauts may be written as "UE" or folded to "U".
+_SUPPLIER_REGEX = re.compile(
+    r"(?P<wuerth>W(?:Ü|UE?)RTH)|(?P<zander>ZANDER)|(?P<buerkle>B(?:Ü|UE?)RKLE)|(?P<sonepar>SONEPAR)"  # noqa: E501
+)
+_SUPPLIER_WEBSITES: dict[str, type[SupplierWebsite]] = {
+    "wuerth": WuerthWebsite,
+    "zander": ZanderWebsite,
+    "buerkle": BuerkleWebsite,
+    "sonepar": SoneparWebsite,
+}
+
+
 def get_supplier_website(supplier: str, sku: str) -> SupplierWebsite | None:
-    """Builds the link for a certain supplier for the product id
+    """Builds the link for a certain supplier for the product id. The website
+    wrappers are cached by supplier and SKU, so data fetched from the website is
+    reused.
 
     Args:
         supplier (str): Name of the supplier
@@ -161,13 +307,65 @@ def get_supplier_website(supplier: str, sku: str) -> SupplierWebsite | None:
     Returns:
         SupplierWebsite: Object wrapper of the suppliers website
     """
+    # use the composed form, so umlauts with a combining diaeresis match as well
+    return _get_supplier_website(unicodedata.normalize("NFC", supplier).upper(), sku)
+
+
+@lru_cache(maxsize=512)
+def _get_supplier_website(upper_supplier: str, sku: str) -> SupplierWebsite | None:
     supplier_website = None
-    if "WÜRTH" in supplier.upper() or "WUERTH" in supplier.upper():
-        supplier_website = WuerthWebsite(sku)
-    elif "ZANDER" in supplier.upper():
-        supplier_website = ZanderWebsite(sku)
-    elif "BÜRKLE" in supplier.upper() or "BUERKLE" in supplier.upper():
-        supplier_website = BuerkleWebsite(sku)
-    elif "SONEPAR" in supplier.upper():
-        supplier_website = SoneparWebsite(sku)
+    website_class = _get_supplier_website_class(upper_supplier)
+    if website_class is not None:
+        supplier_website = website_class(sku)
     return supplier_website
+
+
+@lru_cache(maxsize=256)
+def _get_supplier_website_class(upper_supplier: str) -> type[SupplierWebsite] | None:
+    # Only the name decides on the wrapper, so each supplier is matched once
+    match_object = _SUPPLIER_REGEX.search(upper_supplier)
+    if match_object is None:
+        return None
+    return _SUPPLIER_WEBSITES[match_object.lastgroup]
+
+
+def fetch_part_img_urls(websites: list[SupplierWebsite | None]) -> list[str]:
+    """Acquires the image URLs of several supplier websites concurrently
+
+    Args:
+        websites (list[SupplierWebsite | None]): Website wrappers of the suppliers
+
+    Returns:
+        list[str]: URL of the part image for each website, empty if there is none
+    """
+    # Parts from the Bürkle website are fetched with one request
+    buerkle_websites = [
+        website
+        for website in websites
+        if isinstance(website, BuerkleWebsite) and website.parameters is None
+    ]
+    if len(buerkle_websites) > 1:
+        try:
+            parameters = BuerkleWebsite.fetch_batch(
+                [website.sku for website in buerkle_websites]
+            )
+        except Exception as e:
+            # each website falls back to its own request
+            logger.warning(f"Could not fetch Bürkle parts at once: {e}")
+        else:
+            for website in buerkle_websites:
+                website.parameters = parameters.get(website.sku)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return list(executor.map(_get_part_img_url, websites))
+
+
+def _get_part_img_url(website: SupplierWebsite | None) -> str:
+    # The image is optional, a failing supplier must not abort the scan
+    if website is None:
+        return ""
+    try:
+        return website.get_part_img_url()
+    except Exception as e:
+        logger.warning(f"Could not acquire image URL of {website.sku}: {e}")
+        return ""
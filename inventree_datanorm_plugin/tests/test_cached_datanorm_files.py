@@ -0,0 +1,116 @@
+from importlib import import_module
+from importlib.resources import files
+import os
+import shutil
+import tempfile
+from InvenTree.unit_test import InvenTreeTestCase
+from datanorm import (
+    DatanormBaseFile,
+    DatanormItem,
+    DatanormPriceFile,
+    DatanormProductGroupFile,
+)
+from inventree_datanorm_plugin.cached_datanorm_files import (
+    CachedDatanormBaseFile,
+    CachedDatanormPriceFile,
+    CachedDatanormProductGroupFile,
+)
+
+GOOD_EAN_13_1 = "3250614315336"
+GOOD_EAN_13_2 = "4012195583943"
+
+
+class TestCachedDatanormFiles(InvenTreeTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        package_root = files(
+            import_module(
+                "inventree_datanorm_plugin.tests", package="inventree-datanorm-plugin"
+            )
+        )
+        cls.DATANORM_PATH = str(package_root / "datanorm_test.001")
+        cls.DATANORM_PATH_2 = str(package_root / "datanorm_2_test.001")
+        cls.DATANORM_WRG_PATH = str(package_root / "datanorm_test.WRG")
+        cls.DATPREIS_PATH = str(package_root / "datpreis_test.001")
+        return super().setUpClass()
+
+    def test_base_file(self):
+        for path in (self.DATANORM_PATH, self.DATANORM_PATH_2):
+            for ean in (GOOD_EAN_13_1, GOOD_EAN_13_2):
+                with self.subTest(path=path, ean=ean):
+                    self.assertEqual(
+                        CachedDatanormBaseFile(path)._search_file_for_id(ean),
+                        DatanormBaseFile(path)._search_file_for_id(ean),
+                    )
+
+    def test_base_file__no_ean(self):
+        dut = CachedDatanormBaseFile(self.DATANORM_PATH)
+        for id in ("899977", "MCS316", "", None):
+            with self.subTest(id=id):
+                with self.assertRaises(ValueError):
+                    dut.parse(DatanormItem(), id)
+
+    def test_base_file__modified(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "datanorm.001")
+            shutil.copyfile(self.DATANORM_PATH, path)
+            self.assertIsNotNone(
+                CachedDatanormBaseFile(path)._search_file_for_id(GOOD_EAN_13_1)
+            )
+
+            # replace the EAN of the article and update the modification time
+            with open(path, "rb") as file_obj:
+                content = file_obj.read()
+            with open(path, "wb") as file_obj:
+                file_obj.write(content.replace(b"3250614315336", b"4012195583943"))
+            mtime = os.path.getmtime(path) + 10
+            os.utime(path, (mtime, mtime))
+
+            dut = CachedDatanormBaseFile(path)
+            self.assertIsNone(dut._search_file_for_id(GOOD_EAN_13_1))
+            self.assertEqual(
+                dut._search_file_for_id(GOOD_EAN_13_2),
+                DatanormBaseFile(path)._search_file_for_id(GOOD_EAN_13_2),
+            )
+
+            os.remove(path)
+            self.assertIsNone(dut._search_file_for_id(GOOD_EAN_13_2))
+
+    def test_product_group_file(self):
+        for main_group_id, group_id in (("01", "12"), ("01", "99"), ("99", "12")):
+            with self.subTest(main_group_id=main_group_id, group_id=group_id):
+                self.assertEqual(
+                    CachedDatanormProductGroupFile(
+                        self.DATANORM_WRG_PATH
+                    )._search_file_for_group_ids(main_group_id, group_id),
+                    DatanormProductGroupFile(
+                        self.DATANORM_WRG_PATH
+                    )._search_file_for_group_ids(main_group_id, group_id),
+                )
+
+    def test_price_file(self):
+        for article_id in ("899977", "000000"):
+            with self.subTest(article_id=article_id):
+                self.assertEqual(
+                    CachedDatanormPriceFile(
+                        self.DATPREIS_PATH
+                    )._search_file_for_article_id(article_id),
+                    DatanormPriceFile(self.DATPREIS_PATH)._search_file_for_article_id(
+                        article_id
+                    ),
+                )
+
+    def test_parse(self):
+        di = DatanormItem()
+        DatanormBaseFile(self.DATANORM_PATH).parse(di, GOOD_EAN_13_1)
+        DatanormProductGroupFile(self.DATANORM_WRG_PATH).parse(di)
+        DatanormPriceFile(self.DATPREIS_PATH).parse(di)
+
+        cached_di = DatanormItem()
+        CachedDatanormBaseFile(self.DATANORM_PATH).parse(cached_di, GOOD_EAN_13_1)
+        CachedDatanormProductGroupFile(self.DATANORM_WRG_PATH).parse(cached_di)
+        CachedDatanormPriceFile(self.DATPREIS_PATH).parse(cached_di)
+
+        self.assertTrue(cached_di.is_valid)
+        self.assertEqual(vars(cached_di), vars(di))
@@ -1,8 +1,17 @@
 from importlib import import_module
 from importlib.resources import files
+from io import BytesIO
 import json
+from unittest import mock
+from PIL import Image
+import requests
 from InvenTree.unit_test import InvenTreeTestCase
 from inventree_datanorm_plugin.datanorm_barcode_plugin import DatanormBarcodePlugin
+from inventree_datanorm_plugin.supplier_websites import _get_supplier_website
+from inventree_datanorm_plugin.tests.test_supplier_websites import (
+    ZANDER_IMG_URL,
+    mock_supplier_websites,
+)
 from datanorm import (
     DatanormBaseFile,
     DatanormItem,
@@ -21,17 +30,17 @@ BAD_EAN3 = "ABC-abc-1M"
 
 class TestDatanormBarcodePlugin(InvenTreeTestCase):
 
-    def setUp(self):
-        this_package = import_module(
-            "inventree_datanorm_plugin.tests", package="inventree-datanorm-plugin"
+    @classmethod
+    def setUpClass(cls):
+        package_root = files(
+            import_module(
+                "inventree_datanorm_plugin.tests", package="inventree-datanorm-plugin"
+            )
         )
-        self.DATANORM_PATH = str(files(this_package).joinpath("datanorm_test.001"))
-        self.DATANORM_WRG_PATH = str(files(this_package).joinpath("datanorm_test.WRG"))
-        self.DATANORM_PATH_2 = str(files(this_package).joinpath("datanorm_2_test.001"))
-
-        # Remove all parts to start from clean state with each test
-        Part.objects.all().delete()
-        return super().setUp()
+        cls.DATANORM_PATH = str(package_root / "datanorm_test.001")
+        cls.DATANORM_WRG_PATH = str(package_root / "datanorm_test.WRG")
+        cls.DATANORM_PATH_2 = str(package_root / "datanorm_2_test.001")
+        return super().setUpClass()
 
     def test_is_valid_ean_code(self):
         dut = DatanormBarcodePlugin()
@@ -41,6 +50,8 @@ class TestDatanormBarcodePlugin(InvenTreeTestCase):
         self.assertFalse(dut.is_valid_ean_code(BAD_EAN1))
         self.assertFalse(dut.is_valid_ean_code(BAD_EAN2))
         self.assertFalse(dut.is_valid_ean_code(BAD_EAN3))
+        # 13 digits, but the last one is an Arabic-Indic digit
+        self.assertFalse(dut.is_valid_ean_code("325061431533\u0666"))
 
     def test_create_all_parts(self):
         dut = DatanormBarcodePlugin()
@@ -75,6 +86,76 @@ class TestDatanormBarcodePlugin(InvenTreeTestCase):
         self.assertEqual(s_part_set[1].SKU, "996634")
         self.assertEqual(s_part_set[1].supplier.name, "Firmenname 2")
 
+    def test_create_all_parts_from_datanorm_items__image(self):
+        http_mock = mock_supplier_websites(self)
+        image = BytesIO()
+        Image.new("RGB", (16, 16)).save(image, format="JPEG")
+        http_mock.get(ZANDER_IMG_URL, body=image.getvalue(), content_type="image/jpeg")
+        dut = DatanormBarcodePlugin()
+
+        part = dut.create_all_parts_from_datanorm_items(
+            self.helper_create_zander_datanorm_items()
+        )
+        part.refresh_from_db()
+        self.assertTrue(part.image)
+        self.assertIn(ZANDER_IMG_URL, [call.request.url for call in http_mock.calls])
+        # all supplier parts refer to the only manufacturer part
+        m_part = ManufacturerPart.objects.get(part=part)
+        s_part_set = SupplierPart.objects.filter(part=part)
+        self.assertEqual(len(s_part_set), 2)
+        for s_part in s_part_set:
+            with self.subTest(supplier=s_part.supplier.name):
+                self.assertEqual(s_part.manufacturer_part, m_part)
+
+    def test_create_all_parts_from_datanorm_items__image_failing(self):
+        http_mock = mock_supplier_websites(self)
+        http_mock.get(ZANDER_IMG_URL, body=requests.ConnectionError("unreachable"))
+        dut = DatanormBarcodePlugin()
+
+        part = dut.create_all_parts_from_datanorm_items(
+            self.helper_create_zander_datanorm_items()
+        )
+        # the part is created without an image
+        part.refresh_from_db()
+        self.assertEqual(part.name, "Leitungsschutzschalter AC C 16A 3p")
+        self.assertFalse(part.image)
+        self.assertEqual(SupplierPart.objects.filter(part=part).count(), 2)
+
+    def test_create_all_parts_from_datanorm_items__existing_name(self):
+        dut = DatanormBarcodePlugin()
+        existing_part = Part.objects.create(
+            name="Leitungsschutzschalter AC C 16A 3p",
+            description="",
+            keywords="MCS316,Hager,,MCS316",
+        )
+        part = dut.create_all_parts_from_datanorm_items(
+            self.helper_create_datanorm_items()
+        )
+        self.assertEqual(part.pk, existing_part.pk)
+        # duplicates are dropped, the order is kept and the EAN is appended once
+        part.refresh_from_db()
+        self.assertEqual(part.keywords, f"MCS316,Hager,{GOOD_EAN_13_1}")
+
+    def test_create_all_parts_from_datanorm_items__existing_ean(self):
+        dut = DatanormBarcodePlugin()
+        keywords = f"MCS316,{GOOD_EAN_13_1},MCS316"
+        existing_part = Part.objects.create(
+            name="Leitungsschutzschalter AC C 16A 3p",
+            description="",
+            keywords=keywords,
+        )
+        with mock.patch.object(
+            Part, "save", autospec=True, side_effect=Part.save
+        ) as save_mock:
+            part = dut.create_all_parts_from_datanorm_items(
+                self.helper_create_datanorm_items()
+            )
+        self.assertEqual(part.pk, existing_part.pk)
+        # the part is not saved again, if it already has the EAN as keyword
+        save_mock.assert_not_called()
+        part.refresh_from_db()
+        self.assertEqual(part.keywords, keywords)
+
     def test_scan__create_new_part(self):
         dut = DatanormBarcodePlugin()
 
@@ -159,6 +240,24 @@ class TestDatanormBarcodePlugin(InvenTreeTestCase):
         response = dut.scan(BAD_EAN1)
         self.assertEqual(response, None)
 
+    def helper_create_zander_datanorm_items(self) -> list[DatanormItem]:
+        # the article of the first supplier is served by the mocked Zander website
+        _get_supplier_website.cache_clear()
+        di_1 = DatanormItem("J.W.Zander GmbH & Co.KG")
+        DatanormBaseFile(self.DATANORM_PATH).parse(di_1, GOOD_EAN_13_1)
+        DatanormProductGroupFile(self.DATANORM_WRG_PATH).parse(di_1)
+        di_1.article_id = "2275151"
+
+        di_2 = DatanormItem("Firmenname 2")
+        DatanormBaseFile(self.DATANORM_PATH_2).parse(di_2, GOOD_EAN_13_1)
+        return [di_1, di_2]
+
+    def helper_create_datanorm_items(self) -> list[DatanormItem]:
+        di = DatanormItem("Firmenname")
+        DatanormBaseFile(self.DATANORM_PATH).parse(di, GOOD_EAN_13_1)
+        DatanormProductGroupFile(self.DATANORM_WRG_PATH).parse(di)
+        return [di]
+
     def helper_create_expected_response(self, pk: str) -> dict:
         expected_response = {
             "part": {"pk": pk, "api_url": f"/api/part/{pk}/", "web_url": f"/part/{pk}/"}
@@ -1,6 +1,8 @@
 from decimal import Decimal
 from importlib import import_module
 from importlib.resources import files
+from unittest import mock
+import responses
 from common.models import InvenTreeSetting
 from InvenTree.unit_test import InvenTreeTestCase
 from datanorm import (
@@ -16,17 +18,24 @@ GOOD_EAN_13 = "3250614315336"
 
 class TestDatanormPartFactory(InvenTreeTestCase):
 
-    def setUp(self):
-        InvenTreeSetting().set_setting("INVENTREE_DEFAULT_CURRENCY", "EUR")
-        this_package = import_module(
-            "inventree_datanorm_plugin.tests", package="inventree-datanorm-plugin"
+    @classmethod
+    def setUpClass(cls):
+        package_root = files(
+            import_module(
+                "inventree_datanorm_plugin.tests", package="inventree-datanorm-plugin"
+            )
         )
-        self.DATANORM_PATH = str(files(this_package).joinpath("datanorm_test.001"))
-        self.DATANORM_WRG_PATH = str(files(this_package).joinpath("datanorm_test.WRG"))
-        self.DATPREIS_PATH = str(files(this_package).joinpath("datpreis_test.001"))
+        cls.DATANORM_PATH = str(package_root / "datanorm_test.001")
+        cls.DATANORM_WRG_PATH = str(package_root / "datanorm_test.WRG")
+        cls.DATPREIS_PATH = str(package_root / "datpreis_test.001")
+
+        cls.MPN = "MCS316"
+        return super().setUpClass()
 
-        self.MPN = "MCS316"
-        return super().setUp()
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        InvenTreeSetting().set_setting("INVENTREE_DEFAULT_CURRENCY", "EUR")
 
     # Static methods
     def test_get_si_unit(self):
@@ -67,6 +76,52 @@ class TestDatanormPartFactory(InvenTreeTestCase):
         self.assertTrue(company.is_supplier)
         self.assertTrue(company.is_manufacturer)
 
+    @responses.activate
+    def test_fetch_image(self):
+        responses.get("https://example.com/images/part.jpg", body=b"\xff\xd8" * 1024)
+        image = PartFactory.fetch_image("https://example.com/images/part.jpg")
+        self.assertEqual(image.name, "part.jpg")
+        self.assertEqual(image.read(), b"\xff\xd8" * 1024)
+        image.close()
+
+        self.assertIsNone(PartFactory.fetch_image(""))
+
+    @responses.activate
+    def test_fetch_image__malformed_content_length(self):
+        responses.get(
+            "https://example.com/images/part.jpg",
+            body=b"\xff\xd8" * 1024,
+            headers={"Content-Length": "unknown"},
+        )
+        image = PartFactory.fetch_image("https://example.com/images/part.jpg")
+        self.assertEqual(image.read(), b"\xff\xd8" * 1024)
+        image.close()
+
+    @responses.activate
+    @mock.patch("inventree_datanorm_plugin.part_factory.MAX_IMAGE_SIZE", 1024)
+    def test_fetch_image__too_large(self):
+        # announced size above the limit
+        responses.get(
+            "https://example.com/images/announced.jpg",
+            body=b"\xff" * 2048,
+            headers={"Content-Length": "2048"},
+        )
+        # size only known while streaming
+        responses.get("https://example.com/images/streamed.jpg", body=b"\xff" * 2048)
+        self.assertIsNone(
+            PartFactory.fetch_image("https://example.com/images/announced.jpg")
+        )
+        self.assertIsNone(
+            PartFactory.fetch_image("https://example.com/images/streamed.jpg")
+        )
+
+    @responses.activate
+    def test_fetch_image__not_available(self):
+        responses.get("https://example.com/images/missing.jpg", status=404)
+        self.assertIsNone(
+            PartFactory.fetch_image("https://example.com/images/missing.jpg")
+        )
+
     # Object methods
     def test_get_part_from_datanorm_item(self):
         di = self.helper_build_datanorm_item()
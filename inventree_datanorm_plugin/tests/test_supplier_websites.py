@@ -1,139 +1,260 @@
+from importlib import import_module
+from importlib.resources import files
+import json
+import re
+from unittest import mock
+import responses
+from urllib.parse import parse_qs, urlsplit
 from InvenTree.unit_test import InvenTreeTestCase
 from inventree_datanorm_plugin.supplier_websites import (
     BuerkleWebsite,
     SoneparWebsite,
     WuerthWebsite,
     ZanderWebsite,
+    fetch_part_img_urls,
     get_supplier_website,
+    _get_supplier_website,
+    _get_supplier_website_class,
 )
 
+PACKAGE_ROOT = files(
+    import_module(
+        "inventree_datanorm_plugin.tests", package="inventree-datanorm-plugin"
+    )
+)
+# Recorded responses of the supplier websites
+ZANDER_DETAILS = (PACKAGE_ROOT / "zander_test_details.json").read_bytes()
+WUERTH_PRODUCT = (PACKAGE_ROOT / "wuerth_test_product.html").read_bytes()
+BUERKLE_PRODUCT = json.loads((PACKAGE_ROOT / "buerkle_test_product.json").read_bytes())
 
-class TestSupplierWebsites(InvenTreeTestCase):
 
-    def test_get_supplier_website(self):
-        supplier_website = get_supplier_website("J.W.Zander GmbH & Co.KG", "1234")
-        self.assertIsInstance(supplier_website, ZanderWebsite)
-        supplier_website = get_supplier_website("Adolf Würth GmbH & Co. KG", "1234")
-        self.assertIsInstance(supplier_website, WuerthWebsite)
-        supplier_website = get_supplier_website("Adolf Wuerth GmbH & Co. KG", "1234")
-        self.assertIsInstance(supplier_website, WuerthWebsite)
-        supplier_website = get_supplier_website("Alexander Buerkle", "0134989")
-        self.assertIsInstance(supplier_website, BuerkleWebsite)
-        supplier_website = get_supplier_website("Alexander Bürkle", "0134989")
-        self.assertIsInstance(supplier_website, BuerkleWebsite)
-        supplier_website = get_supplier_website("Sonepar", "1234")
-        self.assertIsInstance(supplier_website, SoneparWebsite)
-
-
-class TestZanderProductInformation(InvenTreeTestCase):
+def buerkle_graphql_callback(request):
+    """Answers the single and the batched product query with the recorded product"""
+    variables = json.loads(request.body)["variables"]
+    product = BUERKLE_PRODUCT["data"]["getProductBySku"]
+    data = dict()
+    for name, sku in variables.items():
+        alias = "getProductBySku" if name == "sku" else name
+        data[alias] = product if sku == "0134989" else None
+    return 200, {}, json.dumps({"data": data})
 
-    def setUp(self):
-        self.ZANDER_SKU = "2275151"
-        return super().setUp()
 
-    def test_get_parameters(self):
-        dut = ZanderWebsite(self.ZANDER_SKU)
-        self.assertEqual(dut.parameters["hersteller"], "HAGER")
+def mock_supplier_websites(test_case: InvenTreeTestCase):
+    """Serves the supplier websites from the recorded responses for the test
 
-    def test_get_part_url(self):
-        dut = ZanderWebsite(self.ZANDER_SKU)
-        link = dut.get_part_url("1234")
-        self.assertEqual(link, "https://zander.online/artikel/1234")
-        link = dut.get_part_url()
-        self.assertEqual(link, "https://zander.online/artikel/2275151")
+    Args:
+        test_case (InvenTreeTestCase): Test, the mock is stopped after
 
-    def test_get_part_img_url(self):
-        dut = ZanderWebsite()
-        dut.parameters = {
-            "artikel_prefix": "MCS316",
-            "artikel_name": "Leitungsschutzschalter AC                         C 16A 3p 415V 3TE 50Hz",  # noqa: E501
-            "artikel_nr": "2275151",
-        }
-        self.assertEqual(
-            dut.get_part_img_url(),
-            "https://media.zander.online/v1/media/2275151/0/600/MCS316-Leitungsschutzschalter-AC-C-16A-3p-415V-3TE-50Hz.jpg",  # noqa: E501
-        )
+    Returns:
+        responses.RequestsMock: Started mock, recording the requests
+    """
+    http_mock = responses.RequestsMock(assert_all_requests_are_fired=False)
+    http_mock.start()
+    test_case.addCleanup(http_mock.stop)
+    test_case.addCleanup(http_mock.reset)
+    zander_api = r"https://zander\.online/api/v1\.0/shop"
+    http_mock.get(re.compile(zander_api + r"/user/open/login\?.*"))
+    http_mock.get(
+        re.compile(zander_api + r"/article/2275151/details\?.*"),
+        body=ZANDER_DETAILS,
+        content_type="application/json",
+    )
+    http_mock.get(re.compile(zander_api + r"/article/0000000/details\?.*"), status=404)
+    # rejects the first request with an expired session ID
+    http_mock.get(re.compile(zander_api + r"/article/1111111/details\?.*"), status=401)
+    http_mock.get(
+        re.compile(zander_api + r"/article/1111111/details\?.*"),
+        body=ZANDER_DETAILS,
+        content_type="application/json",
+    )
+    wuerth_search = r"https://www\.wuerth\.de/web/media/system/search_redirector\.php"
+    http_mock.get(
+        re.compile(wuerth_search + r".*VisibleSearchTerm=005712%2030$"),
+        body=WUERTH_PRODUCT,
+        content_type="text/html",
+    )
+    http_mock.add_callback(
+        responses.POST,
+        "https://api-prod.alexander-buerkle.com/graphql",
+        callback=buerkle_graphql_callback,
+        content_type="application/json",
+    )
+    return http_mock
 
-        dut = ZanderWebsite(2275151)
-        self.assertEqual(
-            dut.get_part_img_url(),
-            "https://media.zander.online/v1/media/2275151/0/600/MCS316-Leitungsschutzschalter-AC-C-16A-3p-415V-3TE-50Hz.jpg",  # noqa: E501
+
+class TestSupplierWebsites(InvenTreeTestCase):
+
+    def test_get_supplier_website(self):
+        cases = (
+            ("J.W.Zander GmbH & Co.KG", "1234", ZanderWebsite),
+            ("Adolf Würth GmbH & Co. KG", "1234", WuerthWebsite),
+            ("Adolf Wuerth GmbH & Co. KG", "1234", WuerthWebsite),
+            ("Adolf Wu\u0308rth GmbH & Co. KG", "1234", WuerthWebsite),
+            ("ADOLF WURTH GMBH & CO. KG", "1234", WuerthWebsite),
+            ("Alexander Buerkle", "0134989", BuerkleWebsite),
+            ("Alexander Bürkle", "0134989", BuerkleWebsite),
+            ("Alexander Burkle", "0134989", BuerkleWebsite),
+            ("Sonepar", "1234", SoneparWebsite),
         )
+        for supplier, sku, website_class in cases:
+            with self.subTest(supplier=supplier):
+                supplier_website = get_supplier_website(supplier, sku)
+                self.assertIsInstance(supplier_website, website_class)
 
+    def test_get_supplier_website__cached_by_name(self):
+        _get_supplier_website.cache_clear()
+        _get_supplier_website_class.cache_clear()
+        get_supplier_website("J.W.Zander GmbH & Co.KG", "1234")
+        get_supplier_website("J.W.Zander GmbH & Co.KG", "5678")
+        cache_info = _get_supplier_website_class.cache_info()
+        self.assertEqual(cache_info.misses, 1)
+        self.assertEqual(cache_info.hits, 1)
 
-class TestWuerthProductInformation(InvenTreeTestCase):
 
-    def setUp(self):
-        self.WUERTH_SKU = "005712 30  100"
-        return super().setUp()
+ZANDER_IMG_URL = "https://media.zander.online/v1/media/2275151/0/600/MCS316-Leitungsschutzschalter-AC-C-16A-3p-415V-3TE-50Hz.jpg"  # noqa: E501
+BUERKLE_IMG_URL = "https://res.cloudinary.com/alexander-buerkle-cloud-services/image/upload/ecommerce/prod/novomind/3439ADF2968728AEE05328C8A8C0E544_DEHA.jpg"  # noqa: E501
 
-    def test_get_parameters(self):
-        WuerthWebsite(self.WUERTH_SKU)
-        pass
 
-    def test_get_part_url(self):
-        dut = WuerthWebsite(self.WUERTH_SKU)
-        link = dut.get_part_url("00578  10 1000")
-        self.assertEqual(
-            link,
-            "https://www.wuerth.de/web/media/system/search_redirector.php?SearchResultType=all&EffectiveSearchTerm=&ApiLocale=de_DE&VisibleSearchTerm=00578%20%2010",  # noqa: E501
+class TestSupplierProductInformation(InvenTreeTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ZANDER_SKU = "2275151"
+        cls.BUERKLE_SKU = "0134989"
+        # (website, other SKU, URL of the other SKU, URL and image URL of the part)
+        # Website wrappers do not fetch on construction, so they are shared
+        cls.CASES = (
+            (
+                ZanderWebsite(cls.ZANDER_SKU),
+                "1234",
+                "https://zander.online/artikel/1234",
+                "https://zander.online/artikel/2275151",
+                ZANDER_IMG_URL,
+            ),
+            (
+                WuerthWebsite("005712 30  100"),
+                "00578  10 1000",
+                "https://www.wuerth.de/web/media/system/search_redirector.php?SearchResultType=all&EffectiveSearchTerm=&ApiLocale=de_DE&VisibleSearchTerm=00578%20%2010",  # noqa: E501
+                "https://www.wuerth.de/web/media/system/search_redirector.php?SearchResultType=all&EffectiveSearchTerm=&ApiLocale=de_DE&VisibleSearchTerm=005712%2030",  # noqa: E501
+                "https://media.wuerth.com/source/eshop/stmedia/wuerth/images/std.lang.all/resolutions/category/576px/29578767.jpg",  # noqa: E501
+            ),
+            (
+                BuerkleWebsite(cls.BUERKLE_SKU),
+                "1234",
+                "https://alexander-buerkle.com/de-de/produkt/1234/",
+                "https://alexander-buerkle.com/de-de/produkt/0134989/",
+                BUERKLE_IMG_URL,
+            ),
+            (
+                SoneparWebsite("0409027"),
+                "1234",
+                "https://www.sonepar.de/dp/1234",
+                "https://www.sonepar.de/dp/0409027",
+                "",
+            ),
         )
-        link = dut.get_part_url()
+        return super().setUpClass()
+
+    def setUp(self):
+        self.http_mock = mock_supplier_websites(self)
+        return super().setUp()
+
+    def assertUrlEqual(self, url: str, expected_url: str):
+        """Compares two URLs independently of the encoding and order of the query"""
+        split_url, split_expected_url = urlsplit(url), urlsplit(expected_url)
         self.assertEqual(
-            link,
-            "https://www.wuerth.de/web/media/system/search_redirector.php?SearchResultType=all&EffectiveSearchTerm=&ApiLocale=de_DE&VisibleSearchTerm=005712%2030",  # noqa: E501
+            split_url._replace(query=""), split_expected_url._replace(query="")
         )
-
-    def test_get_part_img_url(self):
-        dut = WuerthWebsite("019013020 1000")
         self.assertEqual(
-            dut.get_part_img_url(),
-            "https://media.wuerth.com/source/eshop/stmedia/wuerth/images/std.lang.all/resolutions/category/576px/29578767.jpg",  # noqa: E501
+            parse_qs(split_url.query, keep_blank_values=True),
+            parse_qs(split_expected_url.query, keep_blank_values=True),
         )
 
+    def test_get_part_url(self):
+        for dut, other_sku, other_url, url, _img_url in self.CASES:
+            with self.subTest(website=type(dut).__name__):
+                self.assertUrlEqual(dut.get_part_url(other_sku), other_url)
+                self.assertUrlEqual(dut.get_part_url(), url)
 
-class TestBuerkleProductInformation(InvenTreeTestCase):
+    def test_get_part_img_url(self):
+        for dut, _other_sku, _other_url, _url, img_url in self.CASES:
+            with self.subTest(website=type(dut).__name__):
+                self.assertEqual(dut.get_part_img_url(), img_url)
 
-    def setUp(self):
-        self.BUERKLE_SKU = "0134989"
-        return super().setUp()
+    def test_fetch_part_img_urls__buerkle_batch(self):
+        websites = [BuerkleWebsite(self.BUERKLE_SKU), BuerkleWebsite("0000000")]
+        img_urls = fetch_part_img_urls(websites)
+        self.assertEqual(img_urls, [BUERKLE_IMG_URL, ""])
+        # one batch for both parts and a single request for the missing part
+        self.assertEqual(len(self.http_mock.calls), 2)
 
-    def test_get_parameters(self):
-        BuerkleWebsite(self.BUERKLE_SKU)
-        pass
+    def test_fetch_batch__buerkle_batch_size(self):
+        with mock.patch.object(BuerkleWebsite, "BATCH_SIZE", 1):
+            parameters = BuerkleWebsite.fetch_batch([self.BUERKLE_SKU, "0000000"])
+        self.assertEqual(list(parameters), [self.BUERKLE_SKU])
+        self.assertEqual(len(self.http_mock.calls), 2)
 
-    def test_get_part_url(self):
-        dut = BuerkleWebsite(self.BUERKLE_SKU)
-        link = dut.get_part_url("1234")
-        self.assertEqual(link, "https://alexander-buerkle.com/de-de/produkt/1234/")
-        link = dut.get_part_url()
-        self.assertEqual(link, "https://alexander-buerkle.com/de-de/produkt/0134989/")
+    def test_fetch_part_img_urls__failing_website(self):
+        # incomplete parameters fail to build the image URL
+        failing_website = ZanderWebsite("0000000")
+        failing_website.parameters = {"artikel_nr": "0000000"}
+        img_urls = fetch_part_img_urls(
+            [failing_website, BuerkleWebsite(self.BUERKLE_SKU), None]
+        )
+        self.assertEqual(img_urls, ["", BUERKLE_IMG_URL, ""])
 
-    def test_get_part_img_url(self):
-        dut = BuerkleWebsite(self.BUERKLE_SKU)
-        self.assertEqual(
-            dut.get_part_img_url(),
-            "https://res.cloudinary.com/alexander-buerkle-cloud-services/image/upload/ecommerce/prod/novomind/3439ADF2968728AEE05328C8A8C0E544_DEHA.jpg",  # noqa: E501
+    def test_get_part_img_url__wuerth_large_page(self):
+        # the image tag starts 40 bytes before the end of the first 16 KiB chunk
+        img_tag = b'<img class="img-fluid js-socialshare-media" src="https://media.wuerth.com/large.jpg">'  # noqa: E501
+        page = b"x" * (16 * 1024 - 40) + img_tag + b"x" * (64 * 1024)
+        self.http_mock.get(
+            re.compile(r"https://www\.wuerth\.de/.*VisibleSearchTerm=019013020$"),
+            body=page,
+            content_type="text/html",
         )
+        dut = WuerthWebsite("019013020 1000")
+        self.assertEqual(dut.get_part_img_url(), "https://media.wuerth.com/large.jpg")
 
+    def test_get_parameters__zander(self):
+        dut = ZanderWebsite(self.ZANDER_SKU)
+        self.assertIsNone(dut.parameters)
+        dut.fetch_part_parameters(self.ZANDER_SKU)
+        self.assertEqual(dut.parameters["hersteller"], "HAGER")
 
-class TestSoneparProductInformation(InvenTreeTestCase):
+    def test_get_parameters__zander_expired_session(self):
+        ZanderWebsite._login_time = None
+        dut = ZanderWebsite("1111111")
+        dut.fetch_part_parameters("1111111")
+        self.assertEqual(dut.parameters["hersteller"], "HAGER")
+        login_calls = [
+            call for call in self.http_mock.calls if "/login?" in call.request.url
+        ]
+        # login before the first request and after the rejection
+        self.assertEqual(len(login_calls), 2)
 
-    def setUp(self):
-        self.SONEPAR_SKU = "0409027"
-        return super().setUp()
+    def test_get_part_img_url__zander_unknown_part(self):
+        ZanderWebsite._login_time = None
+        dut = ZanderWebsite("0000000")
+        self.assertEqual(dut.get_part_img_url(), "")
+        # an unknown part does not invalidate the session ID
+        urls = [call.request.url for call in self.http_mock.calls]
+        self.assertEqual(len([url for url in urls if "/login?" in url]), 1)
+        self.assertEqual(len([url for url in urls if "/details?" in url]), 1)
 
-    def test_get_parameters(self):
-        SoneparWebsite(self.SONEPAR_SKU)
-        pass
+    def test_get_part_img_url__zander_parameters(self):
+        dut = ZanderWebsite()
+        dut.parameters = {
+            "artikel_prefix": "MCS316",
+            "artikel_name": "Leitungsschutzschalter AC                         C 16A 3p 415V 3TE 50Hz",  # noqa: E501
+            "artikel_nr": "2275151",
+        }
+        self.assertEqual(dut.get_part_img_url(), ZANDER_IMG_URL)
 
-    def test_get_part_url(self):
-        dut = SoneparWebsite(self.SONEPAR_SKU)
-        link = dut.get_part_url("1234")
-        self.assertEqual(link, "https://www.sonepar.de/dp/1234")
-        link = dut.get_part_url()
-        self.assertEqual(link, "https://www.sonepar.de/dp/0409027")
+        dut = ZanderWebsite(2275151)
+        self.assertEqual(dut.get_part_img_url(), ZANDER_IMG_URL)
 
-    def test_get_part_img_url(self):
-        dut = SoneparWebsite(self.SONEPAR_SKU)
-        self.assertEqual(dut.get_part_img_url(), "")
+    def test_fetch_batch__buerkle(self):
+        parameters = BuerkleWebsite.fetch_batch([self.BUERKLE_SKU])
+        self.assertEqual(
+            parameters[self.BUERKLE_SKU]["image"][0]["url"], BUERKLE_IMG_URL
+        )